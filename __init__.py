@@ -1,10 +1,11 @@
 from .language import Language
-from .collections import Word
+from .collections import Word, PackedWord
 from .exceptions import *
 
 __all__ = [
     'Language',
     'Word',
+    'PackedWord',
     'LanguageException',
     'RuleError',
     'SoundChangeError',
@@ -1,9 +1,29 @@
-import argparse
+import argparse, contextlib, importlib.util, itertools, sys
+from typing import Iterable
 from . import *
+from .checkpoint import INTERVAL
+from .lexicon import Lexicon, is_lexicon
+from .stats import CHANGE_KEYS, RULE_KEYS
+
+NUMPY_THRESHOLD = 10000
+CHUNK_SIZE = 4096
+BUFFER_SIZE = 1 << 16
 
 parser = argparse.ArgumentParser(prog=__package__)
 parser.add_argument('language')
 parser.add_argument('lexicon', nargs='?')
+parser.add_argument('-o', '--output', metavar='file')
+parser.add_argument('-b', '--binary', action='store_true')
+parser.add_argument('-e', '--engine', choices=('python', 'numpy'))
+parser.add_argument('-j', '--jobs', default=1, type=int, metavar='num')
+parser.add_argument('-w', '--width', default=70, type=int, metavar='num')
+parser.add_argument('--seed', type=int, metavar='num')
+parser.add_argument('--no-cache', action='store_true')
+parser.add_argument('--checkpoints', nargs='?', const=INTERVAL, type=int, metavar='interval')
+parser.add_argument('--run-size', default=1 << 20, type=int, metavar='num')
+parser.add_argument('--optimizer-report', action='store_true')
+parser.add_argument('--profile', action='store_true')
+parser.add_argument('--profile-sort', choices=CHANGE_KEYS + RULE_KEYS, metavar='key')
 group = parser.add_mutually_exclusive_group()
 group.add_argument('-s', '--sorted', action='store_true')
 group.add_argument('-S', '--sorted-only', action='store_true')
@@ -11,24 +31,75 @@ group = parser.add_mutually_exclusive_group()
 group.add_argument('-t', '--times', default=1, type=int, metavar='num')
 group.add_argument('-T', '--text', nargs='?', const=11, type=int, metavar='num')
 
+if sys.argv[1:2] == ['serve']:
+    from .server import main
+    main(sys.argv[2:])
+    sys.exit()
+
 args = parser.parse_args()
 sorted = args.sorted or args.sorted_only
+if args.run_size < 1:
+    parser.error('--run-size must be at least 1')
+if args.binary and not args.output:
+    parser.error('--binary requires --output')
+if args.binary and args.text:
+    parser.error('--binary cannot be used with --text')
+
+def write(lines: Iterable[str], file):
+    for chunk in itertools.batched(lines, CHUNK_SIZE):
+        file.write('\n'.join(chunk))
+        file.write('\n')
+
+def open_lexicon(file: str):
+    if file == '-':
+        return contextlib.nullcontext(sys.stdin)
+    if is_lexicon(file):
+        return Lexicon(file)
+    return open(file, 'r', encoding='utf-8', buffering=BUFFER_SIZE)
+
+def open_output(file: str | None):
+    if file is None:
+        return contextlib.nullcontext(sys.stdout)
+    return open(file, 'w', encoding='utf-8', buffering=BUFFER_SIZE)
+
+def output(lang: Language, words: Iterable[PackedWord]):
+    if args.binary:
+        lang.write_lexicon(args.output, words)
+        return
+    with open_output(args.output) as out:
+        write((str(lang.decode(word)) for word in words), out)
 
 try:
-    lang = Language(args.language)
+    lang = Language.load(args.language, use_cache=not args.no_cache)
+    if args.profile or args.profile_sort:
+        lang.profile()
+    if args.optimizer_report:
+        for line in lang.optimize():
+            print(line, file=sys.stderr)
     if args.lexicon:
-        with open(args.lexicon, 'r', encoding='utf-8') as f:
-            words = [lang.normalize(line) for line in f]
-        if not args.sorted_only:
-            words = lang.apply(words)
-        if sorted:
-            words = lang.sorted(words)
-        print(*words, sep='\n')
+        with open_lexicon(args.lexicon) as f:
+            words = f.words(lang.inventory) if isinstance(f, Lexicon) else map(lang.inventory.encode, lang.normalize_many(f))
+            if args.checkpoints and not args.sorted_only:
+                words = lang.apply_incremental(words, interval=args.checkpoints)
+            elif not args.sorted_only:
+                words = lang.apply(words, workers=args.jobs, engine=args.engine or 'python')
+            if sorted:
+                words = lang.iter_sorted(words, run_size=args.run_size)
+            output(lang, words)
     elif args.text:
-        print(lang.textify(args.text))
+        with open_output(args.output) as out:
+            write(lang.iter_text(args.text, args.width, seed=args.seed), out)
     else:
-        print(*lang.generate(args.times, sorted=sorted), sep='\n')
+        engine = args.engine or ('numpy' if args.times >= NUMPY_THRESHOLD and args.seed is None and not lang.stats and importlib.util.find_spec('numpy') else 'python')
+        words = lang.iter_generate(args.times, packed=True, engine=engine, seed=args.seed, workers=args.jobs)
+        if sorted:
+            words = lang.iter_sorted(words, run_size=args.run_size)
+        output(lang, words)
+    if lang.stats:
+        print(lang.stats.report(args.profile_sort or 'seconds'), file=sys.stderr)
 except LanguageException as e:
     e.exit()
 except FileNotFoundError as e:
     parser.error(f"can't open language or lexicon '{e.filename}': {e}")
+except ValueError as e:
+    parser.error(str(e))
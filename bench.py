@@ -0,0 +1,113 @@
+import argparse, json, platform, random, string, sys, time, tracemalloc
+from typing import Callable
+from .language import Language
+from .parser import Token
+
+SIZES = {
+    'small': {'variables': 4, 'depth': 2, 'segment_length': 2, 'changes': 10},
+    'medium': {'variables': 16, 'depth': 4, 'segment_length': 3, 'changes': 100},
+    'large': {'variables': 48, 'depth': 6, 'segment_length': 4, 'changes': 400},
+}
+
+def synthesize(variables: int, depth: int, segment_length: int, changes: int, seed = 0):
+    rng = random.Random(seed)
+    letters = list(string.ascii_lowercase)
+    letters += [''.join(rng.choices(string.ascii_lowercase, k=segment_length)) for _ in range(variables)]
+    names = [f'V{i}' for i in range(variables)]
+    lines = ['letters ' + ' '.join(letters)]
+    for name in names:
+        lines.append(f"{name} = {' '.join(rng.sample(letters, rng.randint(2, 12)))}")
+    lines.append(f"r0 :: {' '.join(''.join(rng.sample(names, rng.randint(1, 3))) for _ in range(4))}")
+    for i in range(1, depth + 1):
+        lines.append(f'r{i} :: r{i - 1} r{i - 1}{rng.choice(names)} {rng.choice(names)}r{i - 1}')
+    lines.append(f'word :: r{depth}')
+    for _ in range(changes):
+        source, target = rng.choice(names + letters), rng.choice(letters + [''])
+        before, after = rng.choice(names + ['#', '']), rng.choice(names + ['#', ''])
+        env = f' / {before} _ {after}' if before or after else ''
+        lines.append(f'{source} > {target}{env}')
+    return '\n'.join(lines) + '\n'
+
+def measure(fn: Callable[[], object], repeat: int):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+def run(size: str, count: int, repeat: int):
+    text = synthesize(**SIZES[size])
+    lang = Language()
+    lang.parse(text)
+    lang.normalize_cache.maxsize = lang.apply_cache.maxsize = 0
+    words = lang.generate(count)
+    lines = [str(word) for word in words]
+    tokens = [Token(line) for line in lines]
+    raw = [lang.normalize(line) for line in lines]
+    def parse():
+        Language().parse(text)
+    steps: list[tuple[str, Callable[[], object], int, str]] = [
+        ('parse', parse, len(text.splitlines()), 'lines'),
+        ('generate', lambda: lang.generate(count), count, 'words'),
+        ('normalize', lambda: [token.normalize(lang) for token in tokens], count, 'words'),
+        ('apply', lambda: list(lang.apply(raw)), count, 'words'),
+        ('sorted', lambda: lang.sorted(words), count, 'words'),
+    ]
+    results = []
+    for step, fn, n, unit in steps:
+        seconds, peak = measure(fn, repeat)
+        results.append({
+            'size': size, 'step': step, 'seconds': seconds, 'unit': unit,
+            'per_second': n / seconds if seconds else float('inf'), 'peak_bytes': peak,
+        })
+    return results
+
+def compare(results: list[dict], baseline: list[dict], threshold: float):
+    previous = {(r['size'], r['step']): r for r in baseline}
+    regressions: list[str] = []
+    for r in results:
+        if (old := previous.get((r['size'], r['step']))) and r['per_second'] < old['per_second'] * (1 - threshold):
+            change = r['per_second'] / old['per_second'] - 1
+            regressions.append(f"{r['size']} {r['step']}: {old['per_second']:.0f} -> {r['per_second']:.0f} {r['unit']}/s ({change:+.1%})")
+    return regressions
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog=f'{__package__}.bench')
+    parser.add_argument('-o', '--output', metavar='file')
+    parser.add_argument('-n', '--words', default=20000, type=int, metavar='num')
+    parser.add_argument('-r', '--repeat', default=3, type=int, metavar='num')
+    parser.add_argument('--sizes', default=','.join(SIZES), metavar='list')
+    parser.add_argument('--baseline', metavar='file')
+    parser.add_argument('--threshold', default=0.1, type=float, metavar='frac')
+    args = parser.parse_args(argv)
+
+    results: list[dict] = []
+    for size in args.sizes.split(','):
+        if size not in SIZES:
+            parser.error(f"unknown size '{size}', choose from {', '.join(SIZES)}")
+        for r in run(size, args.words, args.repeat):
+            print(f"{r['size']:<8}{r['step']:<11}{r['per_second']:>14,.0f} {r['unit']}/s{r['peak_bytes'] / 2**20:>10.1f} MiB", file=sys.stderr)
+            results.append(r)
+    report = {'python': platform.python_version(), 'words': args.words, 'results': results}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f)['results'], args.threshold)
+        for line in regressions:
+            print(f'regression: {line}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+import hashlib, os, pickle
+from pathlib import Path
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING: from .language import Language
+
+CACHE_VERSION = 6
+
+def cache_path(file: str, /):
+    path = Path(file)
+    return path.parent / '__pycache__' / f'{path.name}.denpa.pickle'
+
+def digest(file: str, /):
+    with open(file, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()
+
+def load(file: str, /) -> 'Language | None':
+    try:
+        with open(cache_path(file), 'rb') as f:
+            version, hashes = pickle.load(f)
+            if version != CACHE_VERSION or any(digest(source) != h for source, h in hashes):
+                return None
+            return pickle.load(f)
+    except (OSError, EOFError, ValueError, TypeError, AttributeError, ModuleNotFoundError, pickle.UnpicklingError):
+        return None
+
+def store(file: str, lang: 'Language', /):
+    path = cache_path(file)
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    try:
+        path.parent.mkdir(exist_ok=True)
+        with open(tmp, 'wb') as f:
+            pickle.dump((CACHE_VERSION, [(source, digest(source)) for source in lang.files]), f)
+            pickle.dump(lang, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    except OSError:
+        tmp.unlink(missing_ok=True)
@@ -0,0 +1,62 @@
+import hashlib, os, pickle
+from pathlib import Path
+from typing import Iterable
+from .cache import CACHE_VERSION
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING: from .language import Language
+
+INTERVAL = 25
+
+def checkpoint_dir(file: str, /):
+    path = Path(file)
+    return path.parent / '__pycache__' / f'{path.name}.denpa.checkpoints'
+
+def lexicon_digest(lang: 'Language', words: Iterable[tuple[int, ...]], /):
+    h = hashlib.sha256()
+    segments = lang.inventory.segments
+    for word in words:
+        h.update('\x1f'.join([segments[i] for i in word]).encode())
+        h.update(b'\x1e')
+    return h.hexdigest()
+
+def stage_keys(lang: 'Language', lexicon: str, /, interval = INTERVAL) -> list[tuple[int, str]]:
+    h = hashlib.sha256(f'{CACHE_VERSION}\n{lexicon}\n'.encode())
+    h.update(' '.join(sorted(lang.letters)).encode())
+    for name, var in sorted(lang.variables.items()):
+        h.update(f"\n{name} = {' '.join(map(str, var.values))}".encode())
+    keys: list[tuple[int, str]] = []
+    n = len(lang.changes)
+    for stage, change in enumerate(lang.changes, 1):
+        h.update(f'\n{change.text}'.encode())
+        if stage % interval == 0 or stage == n:
+            keys.append((stage, h.hexdigest()))
+    return keys
+
+def snapshot_path(directory: str | Path, stage: int, key: str, /):
+    return Path(directory) / f'{stage:05}-{key}.pickle'
+
+def load(lang: 'Language', directory: str | Path, stage: int, key: str, /) -> list[tuple[int, ...]] | None:
+    try:
+        with open(snapshot_path(directory, stage, key), 'rb') as f:
+            segments, words = pickle.load(f)
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+        return None
+    ids = [lang.inventory.intern(seg) for seg in segments]
+    if ids == list(range(len(ids))):
+        return words
+    return [tuple([ids[i] for i in word]) for word in words]
+
+def store(lang: 'Language', directory: str | Path, stage: int, key: str, words: list[tuple[int, ...]], /):
+    path = snapshot_path(directory, stage, key)
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, 'wb') as f:
+            pickle.dump((lang.inventory.segments, words), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        for stale in path.parent.glob(f'{stage:05}-*.pickle'):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+    except OSError:
+        tmp.unlink(missing_ok=True)
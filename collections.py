@@ -1,16 +1,22 @@
-import math, random
+import bisect, itertools, math, random
+from array import array
+from collections import OrderedDict
 from typing import Iterable
 
+MAX_SEGMENTS = 1 << 16
+
 class Choices[T]:
     def __init__(self, source: Iterable[T] = [], /):
         self.values = list(source)
         self.weights = [1.] * len(self.values)
+        self._cumulative: list[float] | None = None
+        self._indexes: dict[object, int] | None = None
 
     def __len__(self):
         return len(self.values)
 
     def __contains__(self, key: object, /):
-        return key in self.values
+        return _hashable(key) in self._index_map()
 
     def __getitem__(self, key: int, /):
         return self.values[key]
@@ -18,17 +24,33 @@ class Choices[T]:
     def __delitem__(self, key: int, /):
         del self.values[key]
         del self.weights[key]
+        self._invalidate()
+
+    def choose(self, rng: random.Random | None = None, /) -> T:
+        cumulative = self._cumulative or self._build_sampler()
+        x = (rng or random).random() * cumulative[-1]
+        return self.values[bisect.bisect(cumulative, x, 0, len(cumulative) - 1)]
 
-    def choose(self):
-        return random.choices(self.values, self.weights)[0]
+    def choose_index(self, rng: random.Random | None = None, /):
+        cumulative = self._cumulative or self._build_sampler()
+        x = (rng or random).random() * cumulative[-1]
+        return bisect.bisect(cumulative, x, 0, len(cumulative) - 1)
+
+    def choose_many(self, n: int, /, rng: random.Random | None = None) -> list[T]:
+        cumulative = self._cumulative or self._build_sampler()
+        return (rng or random).choices(self.values, cum_weights=cumulative, k=n)
 
     def append(self, value: T, weight = 1., /):
         self.values.append(value)
         self.weights.append(weight)
+        self._cumulative = None
+        if self._indexes is not None:
+            self._indexes.setdefault(_hashable(value), len(self.values) - 1)
 
     def set(self, value: T, weight: float, /):
         try:
             self.weights[self.index(value)] = weight
+            self._cumulative = None
         except ValueError:
             self.append(value, weight)
 
@@ -39,18 +61,39 @@ class Choices[T]:
             pass
 
     def index(self, value: T, /):
-        return self.values.index(value)
+        try:
+            return self._index_map()[_hashable(value)]
+        except KeyError:
+            raise ValueError(f'{value!r} is not in list') from None
 
     def natural_weights(self):
         n = len(self)
         for i in range(n):
             self.weights[i] = (math.log(n + 1) - math.log(i + 1)) / n
+        self._cumulative = None
 
-class Reversed[T](list[T]):
-    def __getitem__(self, key: int, /):
-        if key >= len(self):
-            raise IndexError('list index out of range')
-        return super().__getitem__(len(self) - key - 1)
+    def _invalidate(self):
+        self._cumulative = None
+        self._indexes = None
+
+    def _build_sampler(self):
+        if not self.values:
+            raise IndexError('cannot choose from an empty sequence')
+        cumulative = list(itertools.accumulate(self.weights))
+        if cumulative[-1] <= 0:
+            raise ValueError('total of weights must be greater than zero')
+        self._cumulative = cumulative
+        return cumulative
+
+    def _index_map(self):
+        if self._indexes is None:
+            self._indexes = {}
+            for i, value in enumerate(self.values):
+                self._indexes.setdefault(_hashable(value), i)
+        return self._indexes
+
+def _hashable(value: object):
+    return tuple(value) if isinstance(value, list) else value
 
 class Word(list[str]):
     def __repr__(self):
@@ -58,3 +101,79 @@ class Word(list[str]):
 
     def __str__(self):
         return ''.join(self)
+
+class PackedWord(array):
+    __slots__ = ()
+
+    def __new__(cls, ids: Iterable[int] | bytes = (), /):
+        return super().__new__(cls, 'H', ids)
+
+    def __repr__(self):
+        return f'PackedWord({self.tolist()})'
+
+class Inventory:
+    def __init__(self, segments: Iterable[str] = (), /):
+        self.segments: list[str] = []
+        self.ids: dict[str, int] = {}
+        for segment in segments:
+            self.intern(segment)
+
+    def __len__(self):
+        return len(self.segments)
+
+    def __contains__(self, segment: object, /):
+        return segment in self.ids
+
+    def intern(self, segment: str, /):
+        if (i := self.ids.get(segment)) is None:
+            if len(self.segments) >= MAX_SEGMENTS:
+                raise OverflowError(f'segment inventory is full, cannot add {segment!r}')
+            i = self.ids[segment] = len(self.segments)
+            self.segments.append(segment)
+        return i
+
+    def encode(self, word: Iterable[str], /):
+        try:
+            return PackedWord(map(self.ids.__getitem__, word))
+        except KeyError:
+            return PackedWord(map(self.intern, word))
+
+    def decode(self, word: Iterable[int], /):
+        return Word(map(self.segments.__getitem__, word))
+
+class LRUCache[K, V]:
+    def __init__(self, maxsize = 1 << 16, /):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[K, V] = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __getstate__(self):
+        return {'maxsize': self.maxsize}
+
+    def __setstate__(self, state: dict):
+        self.__init__(state['maxsize'])
+
+    def get(self, key: K, /) -> V | None:
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: K, value: V, /):
+        self._data[key] = value
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data), 'maxsize': self.maxsize}
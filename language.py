@@ -1,10 +1,22 @@
-import random, textwrap
-from typing import Iterable
-from .parser import Parser, Token
-from .collections import Choices, Reversed, Word
+import functools, itertools, random, re, time
+from typing import Iterable, Iterator
+from . import cache, checkpoint, parallel, sort
+from .parser import Parser
+from .collections import Choices, Inventory, LRUCache, PackedWord, Word
 from .exceptions import RuleError, SoundChangeError
+from .stats import Stats
 
-MAX_DEPTH = 10
+MAX_INLINE = 256
+BATCH_SIZE = 1 << 16
+CHUNK_SIZE = 1024
+CACHE_SIZE = 1 << 16
+EXHAUSTIVE_LIMIT = 1 << 20
+MISS_FACTOR = 16
+BLOCK_SIZE = 4096
+TEXT_BATCH = 4096
+
+type Trace = tuple[tuple[tuple[str, int], ...], tuple[int, ...]]
+type Variant = tuple[list, float, list[tuple[str, int]], list[int]]
 
 class Language:
     def __init__(self, file = '', /):
@@ -12,91 +24,561 @@ class Language:
         self.variables: dict[str, Choices[str]] = {}
         self.rules: dict[str, Choices[Word]] = {}
         self.changes: list[SoundChange] = []
+        self.files: list[str] = []
         self.segments: set[str] = set()
         self.longest_segment = 1
+        self._tokenizer: re.Pattern[str] | None = None
+        self.inventory = Inventory()
+        self.normalize_cache = LRUCache[str, tuple[str, ...]](CACHE_SIZE)
+        self.apply_cache = LRUCache[tuple[int, ...], tuple[int, ...]](CACHE_SIZE)
         self._start_rule = ''
+        self._collation: list[bytes] = []
+        self._ranks: dict[str, bytes] = {}
+        self._plans: dict[str, Choices[tuple]] = {}
+        self._traces: dict[str, list[Trace]] = {}
+        self._compiled = False
+        self._optimized: list | None = None
+        self.stats: Stats | None = None
         if file: self.open(file)
 
-    def generate(self, count = 1, /, *, sorted = False):
+    @classmethod
+    def load(cls, file: str, /, *, use_cache = True):
+        if use_cache and (lang := cache.load(file)):
+            return lang
+        lang = cls(file)
+        if use_cache:
+            cache.store(file, lang)
+        return lang
+
+    def generate(self, count = 1, /, *, sorted = False, packed = False, engine = 'python', seed: int | None = None, rng: random.Random | None = None, workers = 1):
+        words = self.iter_generate(count, packed=packed or sorted, engine=engine, seed=seed, rng=rng, workers=workers)
+        if not sorted:
+            return list(words)
+        words = self.sorted(words)
+        return words if packed else list(map(self.decode, words))
+
+    def iter_generate(self, count = 1, /, *, packed = False, engine = 'python', seed: int | None = None, rng: random.Random | None = None, workers = 1) -> Iterator[Word | PackedWord]:
+        if not self.rules:
+            raise RuleError('no rules defined')
+        if not self._compiled:
+            self.compile()
+        plan = self._plans[self.start_rule]
+        if seed is not None and rng is not None:
+            raise ValueError('pass either seed or rng, not both')
+        if engine == 'numpy':
+            if rng is not None:
+                raise ValueError("engine 'numpy' takes a seed, not an rng")
+            from .vector import Generator
+            generator = Generator(seed)
+            sizes = (min(BATCH_SIZE, count - i) for i in range(0, count, BATCH_SIZE))
+            words = (word for n in sizes for word in generator.generate(plan, n))
+        elif engine != 'python':
+            raise ValueError(f"unknown engine '{engine}'")
+        elif rng is not None or seed is None and workers <= 1:
+            run = self._plan_runner()
+            words = (run(plan, rng) for _ in range(count))
+        else:
+            if seed is None:
+                seed = random.getrandbits(64)
+            blocks = ((seed, k, min(BLOCK_SIZE, count - i)) for k, i in enumerate(range(0, count, BLOCK_SIZE)))
+            if workers > 1 and self.stats is None:
+                results = parallel.imap(_generate_chunk, blocks, workers, initializer=_init_worker, initargs=(self,))
+                words = itertools.chain.from_iterable(results)
+                return words if packed else map(self.decode, words)
+            words = (word for block in blocks for word in self._generate_block(*block))
+        words = self.apply(words, workers=workers, engine=engine, optimized=True)
+        return words if packed else map(self.decode, words)
+
+    def generate_unique(self, count = 1, /, *, sorted = False, packed = False, seed: int | None = None, rng: random.Random | None = None):
         if not self.rules:
             raise RuleError('no rules defined')
-        words = self.apply(self._run_rule(self.start_rule) for _ in range(count))
-        return self.sorted(words) if sorted else list(words)
+        if not self._compiled:
+            self.compile()
+        plan = self._plans[self.start_rule]
+        rng = _rng(seed, rng)
+        counts: dict[int, int] = {}
+        total = self._count(plan, counts)
+        if count > total:
+            raise RuleError(f"rule '{self.start_rule}' can produce at most {total} distinct words, {count} requested")
+        seen: dict[tuple[int, ...], None] = {}
+        misses = 0
+        while len(seen) < count and misses < count:
+            drawn, needed = len(seen), count - len(seen)
+            for word in self.apply((self._run_plan(plan, rng) for _ in range(needed)), optimized=True):
+                seen[tuple(word)] = None
+            misses += needed - (len(seen) - drawn)
+        if len(seen) < count:
+            exhaustive = total <= EXHAUSTIVE_LIMIT
+            indexes = (rng or random).sample(range(total), total) if exhaustive else _distinct_indexes(total, rng)
+            derived = (PackedWord(self._unrank(plan, i, counts, [])) for i in indexes)
+            misses = 0
+            for word in self.apply(derived, optimized=True):
+                drawn = len(seen)
+                seen[tuple(word)] = None
+                if len(seen) == count:
+                    break
+                misses = 0 if len(seen) > drawn else misses + 1
+                if not exhaustive and misses >= count * MISS_FACTOR:
+                    break
+        if len(seen) < count:
+            raise RuleError(f"rule '{self.start_rule}' produced only {len(seen)} distinct words after sound changes, {count} requested")
+        words = list(map(PackedWord, itertools.islice(seen, count)))
+        if sorted:
+            words = self.sorted(words)
+        return words if packed else list(map(self.decode, words))
 
-    def textify(self, sentences = 11, width = 70):
-        def sentence():
-            words = [str(word) for word in self.generate(random.randint(4, 12))]
+    def count_words(self, rule = '', /):
+        if not self._compiled:
+            self.compile()
+        return self._count(self._plans[rule or self.start_rule], {})
+
+    def distribution(self, rule = '', /):
+        from .probability import Distribution
+        return Distribution(self, rule)
+
+    def probability(self, word: Word | PackedWord, /):
+        return self.distribution().probability(word)
+
+    def textify(self, sentences = 11, width = 70, *, seed: int | None = None, rng: random.Random | None = None):
+        return '\n'.join(self.iter_text(sentences, width, seed=seed, rng=rng))
+
+    def iter_text(self, sentences = 11, width = 70, *, seed: int | None = None, rng: random.Random | None = None) -> Iterator[str]:
+        if width <= 0:
+            raise ValueError(f'invalid width {width!r} (must be > 0)')
+        rng = _rng(seed, rng)
+        choose = rng or random
+        stream = self._word_stream(rng)
+        line: list[str] = []
+        length = -1
+        for _ in range(sentences):
+            words = [next(stream) for _ in range(choose.randint(4, 12))]
             if len(words) > 6:
-                words[random.randint(1, len(words) - 1)] += ','
-            words[-1] += random.choices('.?!', [8, 1, 1])[0]
-            return ' '.join(words).capitalize()
-        text = ' '.join(sentence() for _ in range(sentences))
-        return textwrap.fill(text, width)
+                words[choose.randint(1, len(words) - 1)] += ','
+            words[-1] += choose.choices('.?!', [8, 1, 1])[0]
+            for token in ' '.join(words).capitalize().split(' '):
+                if not token:
+                    continue
+                if line and length + 1 + len(token) > width:
+                    yield ' '.join(line)
+                    line, length = [], -1
+                while len(token) > width:
+                    yield token[:width]
+                    token = token[width:]
+                line.append(token)
+                length += 1 + len(token)
+        if line:
+            yield ' '.join(line)
+
+    def _word_stream(self, rng: random.Random | None):
+        batch = 64
+        while True:
+            for word in self.iter_generate(batch, packed=True, rng=rng):
+                yield str(self.decode(word))
+            batch = min(batch * 2, TEXT_BATCH)
 
-    def apply(self, words: Iterable[Word], /):
+    def apply[W: (Word, PackedWord)](self, words: Iterable[W], /, *, workers = 1, chunksize = CHUNK_SIZE, engine = 'python', optimized = False) -> Iterator[W]:
+        if not self._compiled:
+            self.compile()
+        words = self._words(words)
+        if self.stats:
+            return self._apply_profiled(words, self.stats)
+        if engine == 'numpy' and workers > 1:
+            chunks = itertools.batched(words, BATCH_SIZE)
+            results = parallel.imap(_apply_vector_chunk, chunks, workers, initializer=_init_worker, initargs=(self,))
+            return itertools.chain.from_iterable(results)
+        if engine == 'numpy':
+            return self._apply_vector(words)
+        if engine != 'python':
+            raise ValueError(f"unknown engine '{engine}'")
+        if workers > 1:
+            chunks = itertools.batched(words, chunksize)
+            apply = functools.partial(_apply_chunk, optimized=optimized)
+            results = parallel.imap(apply, chunks, workers, initializer=_init_worker, initargs=(self,))
+            return itertools.chain.from_iterable(results)
+        return self._apply(words, optimized)
+
+    def _apply[W: (Word, PackedWord)](self, words: Iterable[W], optimized = False, /) -> Iterator[W]:
+        encode, cache = self.inventory.encode, self.apply_cache
+        changes = self.optimized_changes() if optimized else self.changes
+        for word in words:
+            packed = type(word) is PackedWord
+            key = tuple(word if packed else encode(word))
+            if (result := cache.get(key)) is None:
+                result = tuple(self._cascade(list(key), changes))
+                cache.put(key, result)
+            yield PackedWord(result) if packed else self.decode(result)
+
+    def _apply_vector[W: (Word, PackedWord)](self, words: Iterable[W], /) -> Iterator[W]:
+        from .vector import Cascade
+        cascade, encode = Cascade(self), self.inventory.encode
+        for batch in itertools.batched(words, BATCH_SIZE):
+            packed = [type(word) is PackedWord for word in batch]
+            results = cascade.apply([word if p else encode(word) for word, p in zip(batch, packed)])
+            yield from (word if p else self.decode(word) for word, p in zip(results, packed))
+
+    def apply_incremental[W: (Word, PackedWord)](self, words: Iterable[W], /, *, directory: str | None = None, interval = checkpoint.INTERVAL) -> list[W]:
+        if not self._compiled:
+            self.compile()
+        if directory is None:
+            if not self.files:
+                raise ValueError('incremental apply requires a checkpoint directory')
+            directory = str(checkpoint.checkpoint_dir(self.files[0]))
+        encode = self.inventory.encode
+        words = list(self._words(words))
+        packed = [type(word) is PackedWord for word in words]
+        lexicon = [tuple(word if p else encode(word)) for word, p in zip(words, packed)]
+        keys = checkpoint.stage_keys(self, checkpoint.lexicon_digest(self, lexicon), interval)
+        start = 0
+        for stage, key in reversed(keys):
+            if (snapshot := checkpoint.load(self, directory, stage, key)) is not None:
+                start, lexicon = stage, snapshot
+                break
+        for stage, key in keys:
+            if stage > start:
+                changes = self.changes[start:stage]
+                memo: dict[tuple[int, ...], tuple[int, ...]] = {}
+                for i, word in enumerate(lexicon):
+                    if (result := memo.get(word)) is None:
+                        result = memo[word] = tuple(self._cascade(list(word), changes))
+                    lexicon[i] = result
+                checkpoint.store(self, directory, stage, key, lexicon)
+                start = stage
+        return [PackedWord(word) if p else self.decode(word) for word, p in zip(lexicon, packed)]
+
+    def optimize(self):
+        from .optimize import optimize
+        if not self._compiled:
+            self.compile()
+        self._optimized, report = optimize(self)
+        return report
+
+    def optimized_changes(self):
+        if not self._compiled or self._optimized is None:
+            self.optimize()
+        return self._optimized
+
+    def _cascade(self, ids: list[int], changes: list):
+        segments = set(ids)
+        for change in changes:
+            if (result := change._apply(ids, segments)) is not ids:
+                ids, segments = result, set(result)
+        return ids
+
+    def _apply_profiled[W: (Word, PackedWord)](self, words: Iterable[W], stats: Stats, /) -> Iterator[W]:
+        encode, clock = self.inventory.encode, time.perf_counter
         for word in words:
+            packed = type(word) is PackedWord
+            ids = list(word if packed else encode(word))
             for change in self.changes:
-                word = change.apply(word)
-            yield word
+                s = stats.change(change)
+                start = clock()
+                result = change._apply(ids)
+                s.seconds += clock() - start
+                s.calls += 1
+                s.attempts += change._attempts(ids)
+                s.modified += result != ids
+                ids = result
+            yield PackedWord(ids) if packed else self.decode(ids)
+
+    def profile(self, enabled = True, /):
+        self.stats = Stats() if enabled else None
+        return self.stats
+
+    def sorted[W: (Word, PackedWord)](self, words: Iterable[W], /, *, reverse = False) -> list[W]:
+        return sorted(self._words(words), key=self.collation_key, reverse=reverse)
 
-    def sorted(self, words: Iterable[Word], /, *, reverse = False):
-        key = lambda word: [self.letters.get(l, -1) for l in word]
-        return sorted(words, key=key, reverse=reverse)
+    def iter_sorted[W: (Word, PackedWord)](self, words: Iterable[W], /, *, reverse = False, run_size = sort.RUN_SIZE) -> Iterator[W]:
+        return sort.external_sorted(self._words(words), self.collation_key, run_size=run_size, reverse=reverse)
+
+    def write_lexicon(self, file: str, words: Iterable[Word | PackedWord], /):
+        from .lexicon import write
+        encode = self.inventory.encode
+        return write(file, (word if type(word) is PackedWord else encode(word) for word in words), self.inventory)
+
+    def _words[W: (Word, PackedWord)](self, words: Iterable[W], /) -> Iterable[W]:
+        from .lexicon import Lexicon
+        return words.words(self.inventory) if isinstance(words, Lexicon) else words
+
+    def collation_key(self, word: Word | PackedWord, /):
+        if type(word) is not PackedWord:
+            ranks = self._ranks
+            return b''.join([ranks.get(s, b'\0\0') for s in word])
+        table = self._collation
+        if len(table) < len(self.inventory):
+            table += [(self.letters.get(s, -1) + 1).to_bytes(2, 'big') for s in self.inventory.segments[len(table):]]
+        return b''.join([table[i] for i in word])
 
     def normalize(self, text: str, /):
-        return Word(str(t) for t in Token(text.strip()).normalize(self))
+        if (segments := self.normalize_cache.get(text)) is None:
+            segments = tuple(self.tokenizer.findall(text.strip()))
+            self.normalize_cache.put(text, segments)
+        return Word(segments)
+
+    def normalize_many(self, lines: Iterable[str], /) -> Iterator[Word]:
+        return map(self.normalize, lines)
+
+    def encode(self, text: str, /):
+        return self.inventory.encode(self.normalize(text))
+
+    def decode(self, word: Iterable[int], /):
+        return self.inventory.decode(word)
 
     def open(self, file: str, /):
         Parser.open(file).parse(self)
+        self.compile()
 
     def parse(self, text: str, /):
         Parser(text).parse(self)
+        self.compile()
+
+    def cache_info(self):
+        return {'normalize': self.normalize_cache.info(), 'apply': self.apply_cache.info()}
+
+    def compile(self):
+        self.apply_cache.clear()
+        plans: dict[str, Choices[tuple]] = {}
+        traces: dict[str, list[Trace]] = {}
+        visiting: list[str] = []
+        intern = self.inventory.intern
+        variables = {name: self._encode_variable(var) for name, var in self.variables.items() if var}
+        def resolve(name: str) -> Choices[tuple]:
+            if name in plans:
+                return plans[name]
+            if name in visiting:
+                cycle = ' -> '.join(visiting[visiting.index(name):] + [name])
+                raise RuleError(f"rule '{name}' is recursive: {cycle}")
+            visiting.append(name)
+            plan = Choices[tuple]()
+            trace: list[Trace] = []
+            for expansion, weight in zip(self.rules[name].values, self.rules[name].weights):
+                variants: list[Variant] = [([], weight, [], [])]
+                for expr in expansion:
+                    if (item := variables.get(expr)) is not None:
+                        for items, _, _, depths in variants:
+                            items.append(item)
+                            depths.append(0)
+                    elif expr in self.rules:
+                        variants = self._inline(expr, resolve(expr), traces[expr], variants, len(plan))
+                    else:
+                        item = intern(expr)
+                        for items, _, _, depths in variants:
+                            items.append(item)
+                            depths.append(0)
+                for items, w, rules, depths in variants:
+                    plan.append(tuple(reversed(items)), w)
+                    trace.append((tuple(rules), tuple(reversed(depths))))
+            visiting.pop()
+            plans[name] = plan
+            traces[name] = trace
+            return plan
+        for name in self.rules:
+            resolve(name)
+        for change in self.changes:
+            change.compile()
+        self._plans = plans
+        self._traces = traces
+        self._optimized = None
+        self._compiled = True
 
     def update_letters(self, letters: Iterable[str], /):
         self.letters.clear()
+        self._collation.clear()
+        self._ranks.clear()
+        self._invalidate()
         for i, l in enumerate(letters):
             self._cache_segment(l)
+            self.inventory.intern(l)
             self.letters[l] = i
+            self._ranks[l] = (i + 1).to_bytes(2, 'big')
 
     def set_variable(self, name: str, variable: Choices[str], /):
+        self._invalidate()
         self._cache_segment(name)
         for letter in variable:
             self._cache_segment(letter)
+            self.inventory.intern(letter)
         self.variables[name] = variable
 
     def set_rule(self, name: str, rule: Choices[Word], /):
         self._start_rule = ''
+        self._compiled = False
         if name != 'word':
             self._cache_segment(name)
         self.rules[name] = rule
 
+    def _invalidate(self):
+        self._compiled = False
+        self.normalize_cache.clear()
+        self.apply_cache.clear()
+
     def _cache_segment(self, segment: str, /):
         length = len(segment)
-        if length <= 1:
+        if length <= 1 or segment in self.segments:
             return
+        self.normalize_cache.clear()
+        self._tokenizer = None
         self.segments.add(segment)
         if length > self.longest_segment:
             self.longest_segment = length
 
+    @property
+    def tokenizer(self):
+        if self._tokenizer is None:
+            segments = sorted(self.segments, key=len, reverse=True)
+            self._tokenizer = re.compile('|'.join([r'\$.?', *map(re.escape, segments), '.']), re.DOTALL)
+        return self._tokenizer
+
     @property
     def start_rule(self):
         if not self._start_rule:
             self._start_rule = 'word' if 'word' in self.rules else list(self.rules)[-1]
         return self._start_rule
 
-    def _run_rule(self, name: str, depth = 0) -> Word:
-        word = Word()
-        if depth > MAX_DEPTH:
-            raise RuleError(f"rule '{name}' exceeded maximum recursion depth")
-        for expr in self.rules[name].choose():
-            if var := self.variables.get(expr):
-                word.append(var.choose())
-            elif expr in self.rules:
-                word += self._run_rule(expr, depth + 1)
+    def _encode_variable(self, var: Choices[str]) -> Choices[int] | int:
+        ids = [self.inventory.intern(letter) for letter in var]
+        if len(ids) == 1:
+            return ids[0]
+        encoded = Choices(ids)
+        encoded.weights = list(var.weights)
+        return encoded
+
+    @staticmethod
+    def _inline(name: str, sub: Choices[tuple], trace: list[Trace], variants: list[Variant], size: int) -> list[Variant]:
+        if len(sub) == 1:
+            for items, _, rules, depths in variants:
+                items.extend(reversed(sub[0]))
+                _nest(name, trace[0], rules, depths)
+            return variants
+        total = sum(sub.weights)
+        if total <= 0 or size + len(variants) * len(sub) > MAX_INLINE:
+            for items, _, _, depths in variants:
+                items.append(sub)
+                depths.append(0)
+            return variants
+        return [
+            (items + list(reversed(expansion)), w * weight / total, *_nest(name, t, rules[:], depths[:]))
+            for items, w, rules, depths in variants
+            for expansion, weight, t in zip(sub.values, sub.weights, trace)
+        ]
+
+    def _count(self, plan: Choices[tuple], counts: dict[int, int]):
+        if (total := counts.get(id(plan))) is None:
+            total = counts[id(plan)] = sum(self._count_expansion(e, counts) for e in _support(plan))
+        return total
+
+    def _count_expansion(self, expansion: tuple, counts: dict[int, int]):
+        if (total := counts.get(id(expansion))) is None:
+            total = 1
+            for item in expansion:
+                if type(item) is int:
+                    continue
+                elif type(item[0]) is int:
+                    total *= len(_support(item))
+                else:
+                    total *= self._count(item, counts)
+            counts[id(expansion)] = total
+        return total
+
+    def _unrank(self, plan: Choices[tuple], index: int, counts: dict[int, int], word: list[int]):
+        for expansion in _support(plan):
+            n = self._count_expansion(expansion, counts)
+            if index < n:
+                break
+            index -= n
+        for item in reversed(expansion):
+            if type(item) is int:
+                word.append(item)
+            elif type(item[0]) is int:
+                letters = _support(item)
+                index, digit = divmod(index, len(letters))
+                word.append(letters[digit])
             else:
-                word.append(expr)
+                index, digit = divmod(index, self._count(item, counts))
+                self._unrank(item, digit, counts, word)
         return word
 
+    def _generate_block(self, seed: int, index: int, count: int):
+        rng = random.Random(f'{seed}/{index}')
+        plan, run = self._plans[self.start_rule], self._plan_runner()
+        return [run(plan, rng) for _ in range(count)]
+
+    def _plan_runner(self):
+        if self.stats is None:
+            return self._run_plan
+        names = {id(plan): name for name, plan in self._plans.items()}
+        return functools.partial(self._run_plan_profiled, self.stats, names)
+
+    def _run_plan(self, plan: Choices[tuple], rng: random.Random | None = None):
+        word: list[int] = []
+        stack: list = [plan]
+        while stack:
+            item = stack.pop()
+            if type(item) is int:
+                word.append(item)
+            elif type(item := item.choose(rng)) is int:
+                word.append(item)
+            else:
+                stack += item
+        return PackedWord(word)
+
+    def _run_plan_profiled(self, stats: Stats, names: dict[int, str], plan: Choices[tuple], rng: random.Random | None = None):
+        word: list[int] = []
+        stack: list = [(plan, 0)]
+        while stack:
+            item, depth = stack.pop()
+            if type(item) is int:
+                word.append(item)
+            elif type(item[0]) is int:
+                word.append(item.choose(rng))
+            else:
+                name = names[id(item)]
+                i = item.choose_index(rng)
+                inlined, depths = self._traces[name][i]
+                for rule, d in ((name, 0), *inlined):
+                    s = stats.rule(rule)
+                    s.expansions += 1
+                    s.depth = max(s.depth, depth + d)
+                stack += zip(item[i], [depth + d + 1 for d in depths])
+        return PackedWord(word)
+
+def _nest(name: str, trace: Trace, rules: list[tuple[str, int]], depths: list[int]):
+    inlined, levels = trace
+    rules.append((name, 1))
+    rules += [(rule, d + 1) for rule, d in inlined]
+    depths += [d + 1 for d in reversed(levels)]
+    return rules, depths
+
+def _rng(seed: int | None, rng: random.Random | None):
+    if seed is not None and rng is not None:
+        raise ValueError('pass either seed or rng, not both')
+    return random.Random(seed) if seed is not None else rng
+
+def _support[T](choices: Choices[T]) -> list[T]:
+    return list(dict.fromkeys(value for value, weight in zip(choices.values, choices.weights) if weight > 0))
+
+def _distinct_indexes(total: int, rng: random.Random | None = None):
+    randrange = (rng or random).randrange
+    used: set[int] = set()
+    while len(used) < total:
+        if (i := randrange(total)) not in used:
+            used.add(i)
+            yield i
+
+_worker_language: Language
+
+def _init_worker(lang: Language):
+    global _worker_language
+    _worker_language = lang
+
+def _generate_chunk(block: tuple[int, int, int]) -> list[PackedWord]:
+    return list(_worker_language._apply(_worker_language._generate_block(*block), True))
+
+def _apply_chunk[W: (Word, PackedWord)](words: tuple[W, ...], optimized = False) -> list[W]:
+    return list(_worker_language._apply(words, optimized))
+
+def _apply_vector_chunk[W: (Word, PackedWord)](words: tuple[W, ...]) -> list[W]:
+    return list(_worker_language._apply_vector(words))
+
 class SoundChange:
     def __init__(self, language: Language):
         self.language = language
@@ -104,119 +586,250 @@ class SoundChange:
         self.targets: list[Pattern] = []
         self.before = Pattern()
         self.after = Pattern()
+        self.file = ''
+        self.line = 0
+        self.text = ''
+        self._transforms: list[tuple[tuple, frozenset[int], tuple, tuple[frozenset[int], ...]]] | None = None
+        self._before: tuple = ()
+        self._after: tuple = ()
+        self._triggers: frozenset[int] | None = None
 
-    def apply(self, word: Word, /):
+    def compile(self):
+        lang = self.language
+        self._before = self.before.compile_env(lang, reversed=True)
+        self._after = self.after.compile_env(lang)
+        required = _required(self._before) + _required(self._after)
         if not self.sources:
+            self._check_env(0)
+            self._transforms = [((), frozenset(), self.targets[0].compile_target(Pattern(), lang), required)]
+            self._triggers = required[0] if required else None
+            return
+        transforms: list[tuple[tuple, frozenset[int], tuple, tuple[frozenset[int], ...]]] = []
+        for source, target in zip(self.sources, self.targets):
+            self._check_env(len(source))
+            items = source.compile_source(lang)
+            first = frozenset(items[0]) if type(items[0]) is dict else frozenset((items[0],))
+            sets = tuple(frozenset(item) if type(item) is dict else frozenset((item,)) for item in items[1:])
+            transforms.append((items, first, target.compile_target(source, lang), sets + required))
+        self._transforms = transforms
+        self._triggers = frozenset().union(*(first for _, first, _, _ in transforms))
+
+    def apply[W: (Word, PackedWord)](self, word: W, /) -> W:
+        if type(word) is PackedWord:
+            return PackedWord(self._apply(list(word)))
+        return self.language.decode(self._apply(list(self.language.inventory.encode(word))))
+
+    def _apply(self, word: list[int], segments: set[int] | None = None):
+        if self._transforms is None:
+            self.compile()
+        if segments is None:
+            segments = set(word)
+        if self._triggers is not None and self._triggers.isdisjoint(segments):
+            return word
+        if not self.sources:
+            if any(s.isdisjoint(segments) for s in self._transforms[0][3]):
+                return word
             return self._insert(word)
-        for i in range(len(self.sources)):
-            word = self._transform(i, word)
+        for source, first, target, required in self._transforms:
+            if first.isdisjoint(segments) or any(s.isdisjoint(segments) for s in required):
+                continue
+            if (result := self._transform(word, source, first, target)) is not word:
+                word, segments = result, set(result)
         return word
 
-    def _insert(self, word: Word):
-        result, match = Word(), Match()
-        for i in range(len(word) + 1):
-            if self._env(word, i, match):
-                result += self.targets[0].build_target(match, self.language)
-            if i < len(word):
+    def _attempts(self, word: list[int]):
+        if self._transforms is None:
+            self.compile()
+        if not self.sources:
+            return len(word) + 1
+        return sum(seg in first for _, first, _, _ in self._transforms for seg in word)
+
+    def _check_env(self, length: int):
+        for item in self._before + self._after:
+            if type(item) is Backref and item >= length:
+                raise SoundChangeError(f"sound change: backref '${item + 1}' out of bounds of source")
+
+    def _insert(self, word: list[int]):
+        target = self._transforms[0][2]
+        result: list[int] | None = None
+        n = len(word)
+        for i in range(n + 1):
+            if self._env(word, i, 0, n):
+                if result is None:
+                    result = word[:i]
+                self._build(result, target, word, i, 0)
+            if result is not None and i < n:
                 result.append(word[i])
-        return result
-
-    def _transform(self, index: int, word: Word):
-        result = Word()
-        i = 0
-        while i < len(word):
-            match = self.sources[index].match_source(word[i:], self.language)
-            if match and self._env(word, i, match):
-                result += self.targets[index].build_target(match, self.language)
-                i += len(match.letters)
+        return word if result is None else result
+
+    def _transform(self, word: list[int], source: tuple, first: frozenset[int], target: tuple):
+        result: list[int] | None = None
+        i, n, length = 0, len(word), len(source)
+        while i < n:
+            seg = word[i]
+            if seg in first and self._match(source, word, i, n) and self._env(word, i, length, n):
+                if result is None:
+                    result = word[:i]
+                self._build(result, target, word, i, length)
+                i += length
             else:
-                result.append(word[i])
+                if result is not None:
+                    result.append(seg)
                 i += 1
-        return result
+        return word if result is None else result
 
-    def _env(self, word: Word, at: int, match: 'Match'):
-        if self.before and not self.before.match_env(word[:at], match, self.language, reversed=True):
-            return False
-        if self.after and not self.after.match_env(word[at + len(match.letters):], match, self.language):
+    @staticmethod
+    def _match(source: tuple, word: list[int], at: int, n: int):
+        if at + len(source) > n:
             return False
+        for item in source:
+            if type(item) is int:
+                if word[at] != item:
+                    return False
+            elif word[at] not in item:
+                return False
+            at += 1
         return True
 
-class Pattern(list[str]):
-    def match_source(self, letters: list[str], /, lang: Language):
-        if len(self) > len(letters):
-            return None
-        match = Match()
-        for i in range(len(self)):
-            left, right = self[i], letters[i]
-            if var := lang.variables.get(left):
+    def _env(self, word: list[int], at: int, length: int, n: int):
+        return self._match_before(word, at, length) and self._match_after(word, at, length, n)
+
+    def _match_before(self, word: list[int], at: int, length: int):
+        i = at - 1
+        for item in self._before:
+            if item is None:
+                return i < 0
+            if i < 0:
+                return False
+            if type(item) is int:
+                if word[i] != item:
+                    return False
+            elif type(item) is Backref:
+                if item < 0:
+                    for j in range(at + length - 1, at - 1, -1):
+                        if i < 0 or word[i] != word[j]:
+                            return False
+                        i -= 1
+                    continue
+                if word[i] != word[at + item]:
+                    return False
+            elif word[i] not in item:
+                return False
+            i -= 1
+        return True
+
+    def _match_after(self, word: list[int], at: int, length: int, n: int):
+        i = at + length
+        for item in self._after:
+            if item is None:
+                return i >= n
+            if i >= n:
+                return False
+            if type(item) is int:
+                if word[i] != item:
+                    return False
+            elif type(item) is Backref:
+                if item < 0:
+                    for j in range(at, at + length):
+                        if i >= n or word[i] != word[j]:
+                            return False
+                        i += 1
+                    continue
+                if word[i] != word[at + item]:
+                    return False
+            elif word[i] not in item:
+                return False
+            i += 1
+        return True
+
+    @staticmethod
+    def _build(result: list[int], target: tuple, word: list[int], at: int, length: int):
+        for item in target:
+            if type(item) is int:
+                result.append(item)
+            elif type(item) is Backref:
+                if item < 0:
+                    result += word[at:at + length]
+                else:
+                    result.append(word[at + item])
+            else:
+                pos, mapping = item
                 try:
-                    index = var.index(right)
-                    match.append(right, index)
-                except ValueError:
-                    return None
-            elif left == right:
-                match.append(right)
+                    result.append(mapping[word[at + pos]])
+                except KeyError:
+                    raise SoundChangeError("sound change: variable in target out of bounds of matching variable in source") from None
+
+def _required(env: tuple) -> tuple[frozenset[int], ...]:
+    sets: list[frozenset[int]] = []
+    for item in env:
+        if item is None:
+            break
+        if type(item) is int:
+            sets.append(frozenset((item,)))
+        elif type(item) is frozenset:
+            sets.append(item)
+    return tuple(sets)
+
+class Backref(int):
+    pass
+
+class Pattern(list[str]):
+    def compile_source(self, lang: Language, /):
+        intern = lang.inventory.intern
+        items: list[int | dict[int, int]] = []
+        for seg in self:
+            if var := lang.variables.get(seg):
+                indexes: dict[int, int] = {}
+                for i, letter in enumerate(var):
+                    indexes.setdefault(intern(letter), i)
+                items.append(indexes)
             else:
-                return None
-        return match
+                items.append(intern(seg))
+        return tuple(items)
 
-    def match_env(self, letters: list[str], /, match: 'Match', lang: Language, *, reversed = False):
-        env: list[str] = []
+    def compile_env(self, lang: Language, /, *, reversed = False):
+        intern = lang.inventory.intern
+        items: list[int | Backref | frozenset[int] | None] = []
         for seg in self:
-            if seg == '@' or seg == '$0':
-                env += match.letters
-            elif seg[0] == '$':
-                env.append(self._backref(seg, match))
+            if seg == '#':
+                items.append(None)
+            elif seg[0] == '$' or seg == '@':
+                items.append(self._backref(seg))
+            elif var := lang.variables.get(seg):
+                items.append(frozenset(map(intern, var)))
             else:
-                env.append(seg)
+                items.append(intern(seg))
         if reversed:
-            letters = Reversed(letters)
-            env = Reversed(env)
-        for i, left in enumerate(env):
-            if i == len(letters):
-                return left == '#'
-            right = letters[i]
-            if var := lang.variables.get(left):
-                if right not in var:
-                    return False
-                elif left != right:
-                    return False
-        return True
+            items.reverse()
+        return tuple(items)
 
-    def build_target(self, match: 'Match', lang: Language):
-        result: list[str] = []
+    def compile_target(self, source: 'Pattern', lang: Language, /):
+        intern = lang.inventory.intern
+        items: list[int | Backref | tuple[int, dict[int, int]]] = []
         for i, seg in enumerate(self):
-            if seg == '@' or seg == '$0':
-                result += match.letters
-            elif seg[0] == '$':
-                result.append(self._backref(seg, match))
+            if seg[0] == '$' or seg == '@':
+                items.append(ref := self._backref(seg))
+                if ref >= len(source):
+                    raise SoundChangeError(f"sound change: backref '{seg}' out of bounds of source")
             elif var := lang.variables.get(seg):
-                if i >= len(var):
+                if i >= len(source):
                     raise SoundChangeError(f"sound change: variable '{seg}' in target out of bounds of source")
-                index = match.indexes[i]
-                if index < 0:
+                if not (match := lang.variables.get(source[i])):
                     raise SoundChangeError(f"sound change: no matching variable in source for '{seg}' in target")
-                if index > len(var):
-                    raise SoundChangeError(f"sound change: variable '{seg}' in target out of bounds of matching variable in source")
-                result.append(var[index])
+                mapping: dict[int, int] = {}
+                for j, letter in enumerate(match):
+                    if j < len(var):
+                        mapping.setdefault(intern(letter), intern(var[j]))
+                items.append((i, mapping))
             else:
-                result.append(seg)
-        return result
+                items.append(intern(seg))
+        return tuple(items)
 
-    def _backref(self, letter: str, match: 'Match'):
+    @staticmethod
+    def _backref(seg: str):
+        if seg == '@' or seg == '$0':
+            return Backref(-1)
         try:
-            j = int(letter[1]) - 1
-            return match.letters[j]
-        except IndexError:
-            raise SoundChangeError(f"sound change: backref '{letter}' out of bounds of source")
+            return Backref(int(seg[1:]) - 1)
         except ValueError:
-            raise SoundChangeError(f"sound change: backref '{letter}' index not a number")
-
-class Match:
-    def __init__(self):
-        self.letters: list[str] = []
-        self.indexes: list[int] = []
-
-    def append(self, letter: str, index = -1, /):
-        self.letters.append(letter)
-        self.indexes.append(index)
+            raise SoundChangeError(f"sound change: backref '{seg}' index not a number")
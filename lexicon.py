@@ -0,0 +1,138 @@
+import argparse, mmap, struct, sys
+from array import array
+from typing import Iterable, Iterator
+from .collections import Inventory, PackedWord, Word
+
+MAGIC = b'DNPL'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIQQQ')
+LENGTH = struct.Struct('<H')
+SWAP = sys.byteorder != 'little'
+
+class Lexicon:
+    def __init__(self, file: str, /):
+        self.file = file
+        with open(file, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, _, segments, words, table, index = HEADER.unpack_from(self._mmap)
+        except struct.error:
+            magic = version = None
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"'{file}' is not a version {VERSION} binary lexicon")
+        self.segments: list[str] = []
+        self._index = array('Q')
+        try:
+            at = table
+            for _ in range(segments):
+                (n,) = LENGTH.unpack_from(self._mmap, at)
+                self.segments.append(self._mmap[at + 2:at + 2 + n].decode())
+                at += 2 + n
+            self._index.frombytes(self._mmap[index:index + 8 * words])
+        except (struct.error, ValueError) as e:
+            self._mmap.close()
+            raise ValueError(f"'{file}' is a truncated or corrupt binary lexicon") from e
+        if SWAP:
+            self._index.byteswap()
+        self._data = HEADER.size
+        self._end = table
+
+    def __len__(self):
+        return len(self._index)
+
+    def __getitem__(self, i: int, /):
+        at = self._index[i]
+        (n,) = LENGTH.unpack_from(self._mmap, at)
+        return self._word(at + 2, n)
+
+    def __iter__(self) -> Iterator[PackedWord]:
+        at, end, mm, unpack = self._data, self._end, self._mmap, LENGTH.unpack_from
+        while at < end:
+            (n,) = unpack(mm, at)
+            yield self._word(at + 2, n)
+            at += 2 + 2 * n
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._mmap.close()
+
+    def decode(self, i: int, /):
+        return Word(map(self.segments.__getitem__, self[i]))
+
+    def words(self, inventory: Inventory, /) -> Iterator[PackedWord]:
+        table = [inventory.intern(segment) for segment in self.segments]
+        if table == list(range(len(table))):
+            return iter(self)
+        return (PackedWord(map(table.__getitem__, word)) for word in self)
+
+    def _word(self, at: int, n: int):
+        word = PackedWord(self._mmap[at:at + 2 * n])
+        if SWAP:
+            word.byteswap()
+        return word
+
+def is_lexicon(file: str, /):
+    try:
+        with open(file, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+def write(file: str, words: Iterable[PackedWord], inventory: Inventory, /):
+    offsets = array('Q')
+    with open(file, 'wb') as f:
+        f.write(bytes(HEADER.size))
+        at = HEADER.size
+        for word in words:
+            if SWAP:
+                word = PackedWord(word)
+                word.byteswap()
+            offsets.append(at)
+            f.write(LENGTH.pack(len(word)))
+            f.write(word)
+            at += 2 + 2 * len(word)
+        table = at
+        for segment in inventory.segments:
+            data = segment.encode()
+            f.write(LENGTH.pack(len(data)))
+            f.write(data)
+            at += 2 + len(data)
+        f.write(bytes(-at % 8))
+        index = at + -at % 8
+        if SWAP:
+            offsets.byteswap()
+        f.write(offsets)
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(inventory), len(offsets), table, index))
+    return len(offsets)
+
+def main(argv: list[str] | None = None):
+    from .language import Language
+    from .exceptions import LanguageException
+    parser = argparse.ArgumentParser(prog=f'{__package__}.lexicon')
+    parser.add_argument('language')
+    parser.add_argument('input')
+    parser.add_argument('output')
+    args = parser.parse_args(argv)
+    try:
+        lang = Language.load(args.language)
+        if is_lexicon(args.input):
+            with Lexicon(args.input) as lexicon, open(args.output, 'w', encoding='utf-8') as f:
+                for word in lexicon.words(lang.inventory):
+                    f.write(f'{lang.decode(word)}\n')
+        else:
+            with open(args.input, 'r', encoding='utf-8') as f:
+                write(args.output, map(lang.inventory.encode, lang.normalize_many(f)), lang.inventory)
+    except LanguageException as e:
+        e.exit()
+    except (FileNotFoundError, ValueError) as e:
+        parser.error(str(e))
+
+if __name__ == '__main__':
+    main()
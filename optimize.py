@@ -0,0 +1,148 @@
+from .collections import Choices
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING: from .language import Language, SoundChange
+
+type Unit = tuple['SoundChange', int]
+
+class Pass:
+    def __init__(self, units: list[Unit], /):
+        self.units = units
+        self._index: dict[int, tuple['SoundChange', tuple, tuple]] = {}
+        for change, k in units:
+            source, first, target, _ = change._transforms[k]
+            for seg in first:
+                self._index[seg] = (change, source, target)
+        self._triggers = frozenset(self._index)
+
+    def _apply(self, word: list[int], segments: set[int] | None = None):
+        if segments is not None and self._triggers.isdisjoint(segments):
+            return word
+        index = self._index
+        result: list[int] | None = None
+        i, n = 0, len(word)
+        while i < n:
+            seg = word[i]
+            if (unit := index.get(seg)) is not None:
+                change, source, target = unit
+                length = len(source)
+                if change._match(source, word, i, n) and change._env(word, i, length, n):
+                    if result is None:
+                        result = word[:i]
+                    change._build(result, target, word, i, length)
+                    i += length
+                    continue
+            if result is not None:
+                result.append(seg)
+            i += 1
+        return word if result is None else result
+
+class Single:
+    def __init__(self, change: 'SoundChange', k: int, /):
+        self.change = change
+        self.transform = change._transforms[k]
+
+    def _apply(self, word: list[int], segments: set[int] | None = None):
+        source, first, target, required = self.transform
+        if segments is not None and (first.isdisjoint(segments) or any(s.isdisjoint(segments) for s in required)):
+            return word
+        return self.change._transform(word, source, first, target)
+
+def optimize(lang: 'Language', /) -> tuple[list, list[str]]:
+    if not lang._compiled:
+        lang.compile()
+    reachable = _plan_segments(lang._plans[lang.start_rule], set(), set()) if lang.rules else set()
+    report: list[str] = []
+    live: list[Unit] = []
+    for change in lang.changes:
+        alive: list[int] = []
+        for k in range(len(change._transforms)):
+            if _fires(change, k, reachable):
+                alive.append(k)
+                reachable = _forward(change, k, reachable)
+        if not alive:
+            report.append(f'removed {_where(change)}: its source or environment can never occur')
+        elif len(alive) < len(change._transforms):
+            dead = ', '.join(' '.join(change.sources[k]) for k in range(len(change.sources)) if k not in alive)
+            report.append(f'removed unreachable sources {dead} from {_where(change)}')
+        live += [(change, k) for k in alive]
+    footprints = {unit: _footprint(*unit) for unit in live if unit[0].sources}
+    cascade: list = []
+    group: list[Unit] = []
+    for unit in live + [None]:
+        if unit in footprints and group and all(other in footprints and _independent(footprints[other], footprints[unit]) for other in group):
+            group.append(unit)
+            continue
+        if len(group) > 1:
+            cascade.append(Pass(group))
+            lines = sorted({_where(change) for change, _ in group})
+            report.append(f"merged {', '.join(lines) if len(lines) > 1 else f'the sources of {lines[0]}'} into one pass")
+        elif group:
+            change, k = group[0]
+            whole = len(change._transforms) == 1
+            cascade.append(change if whole else Single(change, k))
+        group = [unit] if unit is not None else []
+    return cascade, report
+
+def _where(change: 'SoundChange'):
+    return f'{change.file}:{change.line}' if change.file else f'line {change.line}'
+
+def _plan_segments(plan: Choices[tuple], segments: set[int], seen: set[int]):
+    if id(plan) in seen:
+        return segments
+    seen.add(id(plan))
+    for expansion in plan.values:
+        for item in expansion:
+            if type(item) is int:
+                segments.add(item)
+            elif type(item[0]) is int:
+                segments.update(item.values)
+            else:
+                _plan_segments(item, segments, seen)
+    return segments
+
+def _sets(items: tuple) -> list[frozenset[int]]:
+    return [frozenset(item) if type(item) is dict else frozenset((item,)) for item in items]
+
+def _fires(change: 'SoundChange', k: int, reachable: set[int]):
+    source, _, _, required = change._transforms[k]
+    return all(not s.isdisjoint(reachable) for s in _sets(source[:1]) + list(required))
+
+def _forward(change: 'SoundChange', k: int, reachable: set[int]):
+    from .language import Backref
+    source, first, target, _ = change._transforms[k]
+    sets = _sets(source)
+    produced: set[int] = set()
+    for item in target:
+        if type(item) is Backref:
+            produced |= reachable & (sets[item] if item >= 0 else frozenset().union(*sets))
+        elif type(item) is int:
+            produced.add(item)
+        else:
+            pos, mapping = item
+            produced.update(mapping[seg] for seg in reachable & sets[pos] if seg in mapping)
+    if len(source) == 1 and not change._before and not change._after:
+        return (reachable - first) | produced
+    return reachable | produced
+
+def _footprint(change: 'SoundChange', k: int):
+    from .language import Backref
+    source, _, target, _ = change._transforms[k]
+    sets = _sets(source)
+    env = [item if type(item) is frozenset else frozenset((item,)) for item in change._before + change._after if item is not None and type(item) is not Backref]
+    writes = set().union(*sets)
+    for item in target:
+        if type(item) is int:
+            writes.add(item)
+        elif type(item) is not Backref:
+            writes.update(item[1].values())
+    resizes = sum(len(source) if type(item) is Backref and item < 0 else 1 for item in target) != len(source)
+    spans = bool(change._before or change._after or len(source) > 1)
+    return frozenset().union(*sets, *env), frozenset(writes), resizes, spans
+
+def _independent(a: tuple, b: tuple):
+    reads_a, writes_a, resizes_a, spans_a = a
+    reads_b, writes_b, resizes_b, spans_b = b
+    if not writes_a.isdisjoint(reads_b) or not writes_b.isdisjoint(reads_a):
+        return False
+    return not (resizes_a and spans_b or resizes_b and spans_a)
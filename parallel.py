@@ -0,0 +1,13 @@
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator
+
+def imap[T, R](fn: Callable[[T], R], items: Iterable[T], /, workers: int, *, initializer: Callable[..., object] | None = None, initargs: tuple = ()) -> Iterator[R]:
+    with ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs) as executor:
+        pending: deque[Future[R]] = deque()
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
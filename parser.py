@@ -1,4 +1,4 @@
-import dataclasses, re
+import dataclasses, os, re
 from pathlib import Path
 from .collections import Choices, Word
 from .exceptions import ParseError, ImportError
@@ -12,16 +12,19 @@ COMMENT = re.compile(r'%.*$')
 
 class Parser:
     @staticmethod
-    def open(file: str, /):
+    def open(file: str, /, parent: 'Parser | None' = None):
         with open(file, 'r', encoding='utf-8') as f:
-            return Parser(f.read(), file)
+            return Parser(f.read(), file, parent)
 
-    def __init__(self, text: str, /, file = ''):
+    def __init__(self, text: str, /, file = '', parent: 'Parser | None' = None):
         self.lines = [line.strip().expandtabs() for line in text.splitlines()]
         self.tokens = [Token(line, i, 0) for i, line in enumerate(self.lines)]
         self.file = file
+        self.parent = parent
 
     def parse(self, lang: 'Language', /):
+        if self.file:
+            lang.files.append(os.path.realpath(self.file))
         for line in self.tokens:
             lexed = line.lex()
             if not lexed:
@@ -43,12 +46,27 @@ class Parser:
         if len(line) < 2:
             raise ImportError('no files to import', self, line[0])
         for file in line[1:]:
+            path = str(Path(self.file).parent / str(file))
+            resolved = os.path.realpath(path)
+            chain = self._chain()
+            if resolved in (os.path.realpath(p.file) for p in chain):
+                cycle = ' -> '.join([p.file for p in chain] + [path])
+                raise ImportError(f'import cycle: {cycle}', self, file)
+            if resolved in lang.files:
+                continue
             try:
-                path = Path(self.file).parent / str(file)
-                Parser.open(str(path)).parse(lang)
+                Parser.open(path, self).parse(lang)
             except (FileNotFoundError, ParseError) as e:
                 raise ImportError(f"cannot import '{file}'", self, file) from e
 
+    def _chain(self):
+        chain: list[Parser] = []
+        parser = self
+        while parser:
+            chain.append(parser)
+            parser = parser.parent
+        return chain[::-1]
+
     def _parse_letters(self, line: list['Token'], lang: 'Language'):
         if len(line) < 2:
             raise ParseError("statement: no letters after 'letters'", self, line[0])
@@ -104,6 +122,7 @@ class Parser:
         from .language import SoundChange
         sources, trans, targets, env, before, under, after = Token.partition(line, '>', '/', '_')
         change = SoundChange(lang)
+        change.file, change.line, change.text = self.file, line[0].ln + 1, ' '.join(str(t) for t in line)
         self._parse_transform(sources, trans[0], targets, change)
         self._parse_environment(before, env + under, after, change)
         lang.changes.append(change)
@@ -141,7 +160,7 @@ class Parser:
 
     def _parse_environment(self, before: list['Token'], ops: list['Token'], after: list['Token'], change: 'SoundChange'):
         lenb, leno, lena = len(before), len(ops), len(after)
-        if leno == 0 or lenb == 0:
+        if leno == 0 or lenb == lena == 0:
             return
         if leno == 1 and lenb > 0:
             raise ParseError("sound change: environment missing '_'", self, before[0])
@@ -225,20 +244,7 @@ class Token:
         return result
 
     def normalize(self, lang: 'Language', /):
-        result: list[Token] = []
-        i = 0
-        while i < len(self):
-            if self.text[i] == '$':
-                result.append(self[i:i + 2])
-                i += 2
-                continue
-            for j in range(lang.longest_segment, 0, -1):
-                seg = self[i:i + j]
-                if j == 1 or seg.text in lang.segments:
-                    result.append(seg)
-                    i += j
-                    break
-        return result
+        return [Token(m.group(), self.ln, self.col + m.start()) for m in lang.tokenizer.finditer(self.text)]
 
     def __eq__(self, other: object, /):
         return str(self) == str(other)
@@ -0,0 +1,194 @@
+import heapq, itertools, math
+from typing import Iterable, Iterator
+from .collections import Choices, PackedWord, Word
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING: from .language import Language
+
+type Shape = tuple[int, int, list[frozenset[int]], list[frozenset[int]], bool]
+
+class Distribution:
+    def __init__(self, lang: 'Language', rule = '', /):
+        if not lang._compiled:
+            lang.compile()
+        self.language = lang
+        self.plan = lang._plans[rule or lang.start_rule]
+        self._chart: dict[tuple[int, tuple[int, ...]], float] = {}
+        self._letters: dict[int, dict[int, float]] = {}
+        self._alternatives: dict[int, list[tuple[tuple, float]]] = {}
+        self._lengths: dict[int, tuple[int, int]] = {}
+        self._bests: dict[int, float] = {}
+        self._shapes: dict[int, Shape] = {}
+
+    def probability(self, word: Word | PackedWord, /):
+        ids = tuple(word if type(word) is PackedWord else self.language.inventory.encode(word))
+        return self._derive(self.plan, ids)
+
+    def probabilities(self, words: Iterable[Word | PackedWord], /):
+        return [self.probability(word) for word in words]
+
+    def most_probable(self, count: int | None = None, /, *, packed = False) -> Iterator[tuple[Word | PackedWord, float]]:
+        ambiguous = not self._shape(self.plan)[4]
+        seen: set[tuple[int, ...]] = set()
+        pending: list[tuple[float, int, tuple[int, ...]]] = []
+        order = itertools.count()
+        heap: list[tuple[float, int, float, tuple[int, ...], tuple]] = [(-self._best(self.plan), next(order), 1., (), (self.plan,))]
+        mass, yielded = 1., 0
+        while count is None or yielded < count:
+            while pending and (not heap or -pending[0][0] >= mass):
+                q, _, word = heapq.heappop(pending)
+                result = PackedWord(word)
+                yield (result if packed else self.language.decode(result)), -q
+                yielded += 1
+                if count is not None and yielded >= count:
+                    return
+            if not heap:
+                return
+            _, _, p, word, stack = heapq.heappop(heap)
+            mass -= p
+            while stack and type(stack[-1]) is int:
+                word += (stack[-1],)
+                stack = stack[:-1]
+            if not stack:
+                if not ambiguous:
+                    result = PackedWord(word)
+                    yield (result if packed else self.language.decode(result)), p
+                    yielded += 1
+                elif word not in seen:
+                    seen.add(word)
+                    heapq.heappush(pending, (-self._derive(self.plan, word), next(order), word))
+                continue
+            item, stack = stack[-1], stack[:-1]
+            rest = math.prod(map(self._best, stack))
+            if type(item[0]) is int:
+                children = [(p * q, rest, word + (letter,), stack) for letter, q in self._letter_probabilities(item).items()]
+            else:
+                children = [(p * q, rest * self._best_sequence(expansion), word, stack + expansion) for expansion, q in self._alternative_probabilities(item)]
+            for q, bound, child, remaining in children:
+                heapq.heappush(heap, (-q * bound, next(order), q, child, remaining))
+                mass += q
+
+    def _derive(self, plan: Choices[tuple], word: tuple[int, ...]):
+        key = (id(plan), word)
+        if (p := self._chart.get(key)) is None:
+            shortest, longest = self._length(plan)
+            p = 0.
+            if shortest <= len(word) <= longest:
+                for expansion, q in self._alternative_probabilities(plan):
+                    p += q * self._sequence(expansion, word)
+            self._chart[key] = p
+        return p
+
+    def _sequence(self, expansion: tuple, word: tuple[int, ...]):
+        n = len(word)
+        reach = {0: 1.}
+        for item in reversed(expansion):
+            following: dict[int, float] = {}
+            for i, p in reach.items():
+                if type(item) is int:
+                    if i < n and word[i] == item:
+                        following[i + 1] = following.get(i + 1, 0.) + p
+                elif type(item[0]) is int:
+                    if i < n and (q := self._letter_probabilities(item).get(word[i])):
+                        following[i + 1] = following.get(i + 1, 0.) + p * q
+                else:
+                    shortest, longest = self._length(item)
+                    for j in range(i + shortest, min(i + longest, n) + 1):
+                        if q := self._derive(item, word[i:j]):
+                            following[j] = following.get(j, 0.) + p * q
+            if not (reach := following):
+                return 0.
+        return reach.get(n, 0.)
+
+    def _letter_probabilities(self, var: Choices[int]):
+        if (letters := self._letters.get(id(var))) is None:
+            total = sum(var.weights)
+            letters = self._letters[id(var)] = {}
+            for letter, weight in zip(var.values, var.weights):
+                if weight > 0:
+                    letters[letter] = letters.get(letter, 0.) + weight / total
+        return letters
+
+    def _alternative_probabilities(self, plan: Choices[tuple]):
+        if (alternatives := self._alternatives.get(id(plan))) is None:
+            total = sum(plan.weights)
+            alternatives = self._alternatives[id(plan)] = [
+                (expansion, weight / total)
+                for expansion, weight in zip(plan.values, plan.weights)
+                if weight > 0
+            ]
+        return alternatives
+
+    def _length(self, plan: Choices[tuple]) -> tuple[int, int]:
+        if (bounds := self._lengths.get(id(plan))) is None:
+            shortest, longest = [], []
+            for expansion in plan.values:
+                low = high = 0
+                for item in expansion:
+                    if type(item) is int or type(item[0]) is int:
+                        low, high = low + 1, high + 1
+                    else:
+                        a, b = self._length(item)
+                        low, high = low + a, high + b
+                shortest.append(low)
+                longest.append(high)
+            bounds = self._lengths[id(plan)] = (min(shortest), max(longest))
+        return bounds
+
+    def _best(self, item) -> float:
+        if type(item) is int:
+            return 1.
+        if (best := self._bests.get(id(item))) is None:
+            if type(item[0]) is int:
+                best = max(self._letter_probabilities(item).values(), default=0.)
+            else:
+                best = max((q * self._best_sequence(expansion) for expansion, q in self._alternative_probabilities(item)), default=0.)
+            self._bests[id(item)] = best
+        return best
+
+    def _best_sequence(self, expansion: tuple):
+        if (best := self._bests.get(id(expansion))) is None:
+            best = self._bests[id(expansion)] = math.prod(map(self._best, expansion))
+        return best
+
+    def _shape(self, item) -> Shape:
+        if type(item) is int:
+            return 1, 1, [frozenset((item,))], [frozenset((item,))], True
+        if (shape := self._shapes.get(id(item))) is None:
+            if type(item[0]) is int:
+                letters = frozenset(self._letter_probabilities(item))
+                shape = (1, 1, [letters], [letters], True)
+            else:
+                shapes = [self._sequence_shape(expansion) for expansion, _ in self._alternative_probabilities(item)]
+                shape = (
+                    min((s[0] for s in shapes), default=0),
+                    max((s[1] for s in shapes), default=0),
+                    [frozenset().union(*sets) for sets in zip(*(s[2] for s in shapes))],
+                    [frozenset().union(*sets) for sets in zip(*(s[3] for s in shapes))],
+                    all(s[4] for s in shapes) and all(_disjoint(a, b) for a, b in itertools.combinations(shapes, 2)),
+                )
+            self._shapes[id(item)] = shape
+        return shape
+
+    def _sequence_shape(self, expansion: tuple) -> Shape:
+        shapes = [self._shape(item) for item in reversed(expansion)]
+        return (
+            sum(s[0] for s in shapes),
+            sum(s[1] for s in shapes),
+            _edge(shapes, 2),
+            _edge(reversed(shapes), 3),
+            all(s[4] for s in shapes) and sum(s[0] != s[1] for s in shapes) <= 1,
+        )
+
+def _edge(shapes: Iterable[Shape], side: int):
+    sets: list[frozenset[int]] = []
+    for shape in shapes:
+        sets += shape[side]
+        if shape[0] != shape[1]:
+            break
+    return sets
+
+def _disjoint(a: Shape, b: Shape):
+    if a[1] < b[0] or b[1] < a[0]:
+        return True
+    return any(x.isdisjoint(y) for side in (2, 3) for x, y in zip(a[side], b[side]))
@@ -0,0 +1,217 @@
+import argparse, asyncio, functools, json, os, sys
+from typing import Awaitable, Callable
+from .language import Language
+from .exceptions import LanguageException
+
+POLL_INTERVAL = 1.
+MAX_LINE = 1 << 24
+
+type Batch = list[tuple[dict, asyncio.Future]]
+
+class Server:
+    def __init__(self, file: str, /, *, use_cache = True):
+        self.file = file
+        self.use_cache = use_cache
+        self.language = Language.load(file, use_cache=use_cache)
+        self._mtimes = self._stat()
+        self._batches: dict[str, Batch] = {'generate': [], 'apply': []}
+        self._scheduled = False
+
+    async def handle(self, request: dict):
+        op = request.get('op')
+        if op in self._batches:
+            _validate(op, request)
+            future = asyncio.get_running_loop().create_future()
+            self._batches[op].append((request, future))
+            if not self._scheduled:
+                self._scheduled = True
+                asyncio.get_running_loop().call_soon(self._flush)
+            return await future
+        lang = self.language
+        if op == 'normalize':
+            return [list(lang.normalize(text)) for text in _strings(request, 'words')]
+        if op == 'sort':
+            words = lang.normalize_many(_strings(request, 'words'))
+            return [str(word) for word in lang.sorted(words, reverse=bool(request.get('reverse')))]
+        if op == 'textify':
+            return lang.textify(_integer(request, 'sentences', 11), _integer(request, 'width', 70))
+        if op == 'reload':
+            return self.reload()
+        raise ValueError(f"unknown op '{op}'")
+
+    def reload(self):
+        self._mtimes = self._stat()
+        self.language = Language.load(self.file, use_cache=self.use_cache)
+
+    async def watch(self, interval = POLL_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            if self._stat() == self._mtimes:
+                continue
+            try:
+                self.reload()
+                print(f'reloaded {self.file}', file=sys.stderr)
+            except (LanguageException, OSError) as e:
+                print(f"can't reload {self.file}: {e}", file=sys.stderr)
+
+    async def session(self, lines: Callable[[], Awaitable[bytes]], write: Callable[[bytes], object]):
+        tasks: set[asyncio.Task] = set()
+        while True:
+            try:
+                line = await lines()
+            except ValueError as e:
+                write(json.dumps({'id': None, 'error': f'{e.__class__.__name__}: {e}'}).encode() + b'\n')
+                continue
+            if not line:
+                break
+            if not line.strip():
+                continue
+            task = asyncio.create_task(self._respond(line, write))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+
+    async def _respond(self, line: bytes, write: Callable[[bytes], object]):
+        key = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('request must be a JSON object')
+            key = request.get('id')
+            response = {'id': key, 'result': await self.handle(request)}
+        except (LanguageException, OSError, ValueError, TypeError) as e:
+            response = {'id': key, 'error': f'{e.__class__.__name__}: {e}'}
+        write(json.dumps(response, ensure_ascii=False).encode() + b'\n')
+
+    def _flush(self):
+        self._scheduled = False
+        batches, self._batches = self._batches, {op: [] for op in self._batches}
+        lang = self.language
+        if batch := batches['generate']:
+            counts = [_integer(request, 'count', 1) for request, _ in batch]
+            _resolve(batch, lambda: _split(lang.generate(sum(counts), packed=True), counts), lambda request, words: [
+                str(lang.decode(word)) for word in (lang.sorted(words) if request.get('sorted') else words)
+            ])
+        if batch := batches['apply']:
+            groups = [_strings(request, 'words') for request, _ in batch]
+            words = [word for group in groups for word in group]
+            _resolve(batch, lambda: _split(list(lang.apply(lang.normalize_many(words))), list(map(len, groups))), lambda request, words: [
+                str(word) for word in words
+            ])
+
+    def _stat(self):
+        mtimes: list[int] = []
+        for file in self.language.files or [self.file]:
+            try:
+                mtimes.append(os.stat(file).st_mtime_ns)
+            except OSError:
+                mtimes.append(-1)
+        return mtimes
+
+def _validate(op: str, request: dict):
+    if op == 'generate':
+        _integer(request, 'count', 1)
+    else:
+        _strings(request, 'words')
+
+def _integer(request: dict, key: str, default: int):
+    value = request.get(key, default)
+    if type(value) is not int or value < 0:
+        raise ValueError(f"'{key}' must be a non-negative integer")
+    return value
+
+def _strings(request: dict, key: str) -> list[str]:
+    value = request.get(key)
+    if not isinstance(value, list) or not all(isinstance(s, str) for s in value):
+        raise ValueError(f"'{key}' must be a list of strings")
+    return value
+
+def _split[T](items: list[T], counts: list[int]):
+    groups: list[list[T]] = []
+    i = 0
+    for n in counts:
+        groups.append(items[i:i + n])
+        i += n
+    return groups
+
+def _resolve(batch: Batch, run: Callable[[], list[list]], finish: Callable[[dict, list], list]):
+    try:
+        groups = run()
+    except (LanguageException, ValueError) as e:
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(e)
+        return
+    for (request, future), group in zip(batch, groups):
+        if not future.done():
+            future.set_result(finish(request, group))
+
+async def _readline(reader: asyncio.StreamReader):
+    overrun = False
+    while True:
+        try:
+            line = await reader.readuntil()
+        except asyncio.IncompleteReadError as e:
+            line = e.partial
+        except asyncio.LimitOverrunError as e:
+            await reader.readexactly(e.consumed)
+            overrun = True
+            continue
+        if overrun:
+            raise ValueError(f'request line longer than {MAX_LINE} bytes')
+        return line
+
+async def serve(server: Server, /, *, host: str | None = None, port: int | None = None, unix: str | None = None, poll = POLL_INTERVAL):
+    watcher = asyncio.create_task(server.watch(poll)) if poll > 0 else None
+    async def connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await server.session(functools.partial(_readline, reader), writer.write)
+            await writer.drain()
+        finally:
+            writer.close()
+    try:
+        if unix:
+            async with await asyncio.start_unix_server(connection, unix, limit=MAX_LINE) as s:
+                await s.serve_forever()
+        elif port is not None:
+            async with await asyncio.start_server(connection, host, port, limit=MAX_LINE) as s:
+                await s.serve_forever()
+        else:
+            loop = asyncio.get_running_loop()
+            reader = asyncio.StreamReader(limit=MAX_LINE)
+            lines: Callable[[], Awaitable[bytes]] = functools.partial(_readline, reader)
+            try:
+                await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+            except ValueError:
+                lines = lambda: loop.run_in_executor(None, sys.stdin.buffer.readline)
+            def write(data: bytes):
+                sys.stdout.buffer.write(data)
+                sys.stdout.buffer.flush()
+            await server.session(lines, write)
+    finally:
+        if watcher:
+            watcher.cancel()
+
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog=f'{__package__} serve')
+    parser.add_argument('language')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--port', type=int, metavar='num')
+    group.add_argument('--unix', metavar='path')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--poll', default=POLL_INTERVAL, type=float, metavar='seconds')
+    parser.add_argument('--no-cache', action='store_true')
+    args = parser.parse_args(argv)
+    try:
+        server = Server(args.language, use_cache=not args.no_cache)
+        asyncio.run(serve(server, host=args.host, port=args.port, unix=args.unix, poll=args.poll))
+    except LanguageException as e:
+        e.exit()
+    except FileNotFoundError as e:
+        parser.error(f"can't open language '{e.filename}': {e}")
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+import heapq, itertools, operator, pickle, tempfile
+from typing import IO, Callable, Iterable, Iterator
+
+RUN_SIZE = 1 << 20
+BLOCK_SIZE = 4096
+
+def external_sorted[T](items: Iterable[T], /, key: Callable[[T], bytes], *, run_size = RUN_SIZE, reverse = False, dir: str | None = None) -> Iterator[T]:
+    if run_size < 1:
+        raise ValueError(f'invalid run size {run_size!r} (must be > 0)')
+    items = iter(items)
+    run = _sorted_run(itertools.islice(items, run_size), key, reverse)
+    if len(run) < run_size:
+        yield from (item for _, item in run)
+        return
+    files: list[IO[bytes]] = []
+    try:
+        while run:
+            files.append(_spill(run, dir))
+            run = _sorted_run(itertools.islice(items, run_size), key, reverse)
+        merged = heapq.merge(*map(_read, files), key=operator.itemgetter(0), reverse=reverse)
+        yield from (item for _, item in merged)
+    finally:
+        for f in files:
+            f.close()
+
+def _sorted_run[T](items: Iterable[T], key: Callable[[T], bytes], reverse: bool):
+    return sorted(((key(item), item) for item in items), key=operator.itemgetter(0), reverse=reverse)
+
+def _spill(run: list, dir: str | None):
+    f = tempfile.TemporaryFile(dir=dir)
+    for block in itertools.batched(run, BLOCK_SIZE):
+        pickle.dump(block, f, pickle.HIGHEST_PROTOCOL)
+    f.seek(0)
+    return f
+
+def _read(f: IO[bytes]):
+    while True:
+        try:
+            yield from pickle.load(f)
+        except EOFError:
+            return
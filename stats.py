@@ -0,0 +1,61 @@
+import dataclasses
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING: from .language import SoundChange
+
+CHANGE_KEYS = ('seconds', 'calls', 'modified', 'attempts', 'line')
+RULE_KEYS = ('expansions', 'depth', 'name')
+
+@dataclasses.dataclass
+class ChangeStats:
+    change: 'SoundChange'
+    calls: int = 0
+    modified: int = 0
+    attempts: int = 0
+    seconds: float = 0.
+
+    @property
+    def line(self):
+        return (self.change.file, self.change.line)
+
+@dataclasses.dataclass
+class RuleStats:
+    name: str
+    expansions: int = 0
+    depth: int = 0
+
+class Stats:
+    def __init__(self):
+        self.changes: dict['SoundChange', ChangeStats] = {}
+        self.rules: dict[str, RuleStats] = {}
+
+    def change(self, change: 'SoundChange', /):
+        if (stats := self.changes.get(change)) is None:
+            stats = self.changes[change] = ChangeStats(change)
+        return stats
+
+    def rule(self, name: str, /):
+        if (stats := self.rules.get(name)) is None:
+            stats = self.rules[name] = RuleStats(name)
+        return stats
+
+    def sorted_changes(self, key = 'seconds', /):
+        if key not in CHANGE_KEYS:
+            raise ValueError(f"unknown sort key '{key}', choose from {', '.join(CHANGE_KEYS)}")
+        return sorted(self.changes.values(), key=lambda s: getattr(s, key), reverse=key != 'line')
+
+    def sorted_rules(self, key = 'expansions', /):
+        if key not in RULE_KEYS:
+            raise ValueError(f"unknown sort key '{key}', choose from {', '.join(RULE_KEYS)}")
+        return sorted(self.rules.values(), key=lambda s: getattr(s, key), reverse=key != 'name')
+
+    def report(self, key = 'seconds', /):
+        lines = [f"{'seconds':>10} {'calls':>10} {'modified':>10} {'attempts':>10}  change"]
+        for s in self.sorted_changes(key if key in CHANGE_KEYS else 'seconds'):
+            where = f'{s.change.file}:{s.change.line}' if s.change.file else f'line {s.change.line}'
+            lines.append(f'{s.seconds:>10.4f} {s.calls:>10} {s.modified:>10} {s.attempts:>10}  {where}  {s.change.text}')
+        lines.append('')
+        lines.append(f"{'expansions':>10} {'depth':>10}  rule")
+        for s in self.sorted_rules(key if key in RULE_KEYS else 'expansions'):
+            lines.append(f'{s.expansions:>10} {s.depth:>10}  {s.name}')
+        return '\n'.join(lines)
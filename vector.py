@@ -0,0 +1,197 @@
+import numpy as np
+from .collections import Choices, PackedWord
+from .exceptions import SoundChangeError
+
+from typing import TYPE_CHECKING
+if TYPE_CHECKING: from .language import Language, SoundChange
+
+class Generator:
+    def __init__(self, seed: int | None = None, /):
+        self.rng = np.random.default_rng(seed)
+        self._variables: dict[int, tuple[np.ndarray, np.ndarray]] = {}
+
+    def generate(self, plan: Choices[tuple], count: int, /):
+        matrix, lengths = self._expand(plan, count)
+        matrix = matrix.astype(np.uint16)
+        return [PackedWord(row[:n].tobytes()) for row, n in zip(matrix, lengths.tolist())]
+
+    def _sample(self, cumulative: np.ndarray, count: int):
+        draws = self.rng.random(count) * cumulative[-1]
+        return np.minimum(np.searchsorted(cumulative, draws, side='right'), len(cumulative) - 1)
+
+    def _variable(self, var: Choices[int]):
+        if (cached := self._variables.get(id(var))) is None:
+            ids = np.array(var.values, dtype=np.int32)
+            cached = self._variables[id(var)] = (ids, np.cumsum(var.weights))
+        return cached
+
+    def _expand(self, plan: Choices[tuple], count: int) -> tuple[np.ndarray, np.ndarray]:
+        choice = self._sample(np.cumsum(plan.weights), count)
+        groups: list[tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        for a, expansion in enumerate(plan.values):
+            rows = np.flatnonzero(choice == a)
+            if len(rows):
+                groups.append((rows, *self._concat(reversed(expansion), len(rows))))
+        width = max(matrix.shape[1] for _, matrix, _ in groups)
+        matrix = np.full((count, width), -1, dtype=np.int32)
+        lengths = np.zeros(count, dtype=np.int32)
+        for rows, m, n in groups:
+            matrix[rows, :m.shape[1]] = m
+            lengths[rows] = n
+        return matrix, lengths
+
+    def _concat(self, items, count: int):
+        pieces: list[tuple[np.ndarray, np.ndarray]] = []
+        for item in items:
+            if type(item) is int:
+                pieces.append((np.full((count, 1), item, dtype=np.int32), np.ones(count, dtype=np.int32)))
+            elif type(item.values[0]) is int:
+                ids, cumulative = self._variable(item)
+                pieces.append((ids[self._sample(cumulative, count)][:, None], np.ones(count, dtype=np.int32)))
+            else:
+                pieces.append(self._expand(item, count))
+        width = sum(m.shape[1] for m, _ in pieces)
+        matrix = np.full((count, max(width, 1)), -1, dtype=np.int32)
+        offset = np.zeros(count, dtype=np.int32)
+        for m, n in pieces:
+            if m.shape[1] == 1 and n.all():
+                matrix[np.arange(count), offset] = m[:, 0]
+            else:
+                r, c = np.nonzero(np.arange(m.shape[1]) < n[:, None])
+                matrix[r, offset[r] + c] = m[r, c]
+            offset += n
+        return matrix, offset
+
+class Cascade:
+    def __init__(self, lang: 'Language', /):
+        self.language = lang
+        self._size = -1
+        self._plans: dict['SoundChange', tuple[tuple, tuple, list[tuple]] | None] = {}
+
+    def apply(self, words: list[PackedWord], /):
+        lang = self.language
+        if not lang._compiled:
+            lang.compile()
+        matrix, lengths = _pack(words)
+        if (size := max(len(lang.inventory), int(matrix.max(initial=-1)) + 1)) > self._size:
+            self._size, self._plans = size, {}
+        for change in lang.changes:
+            if (plan := self._plans.get(change, False)) is False:
+                plan = self._plans[change] = self._compile(change)
+            if plan is None:
+                words = [PackedWord(change._apply(word.tolist())) for word in _unpack(matrix, lengths)]
+                matrix, lengths = _pack(words)
+                continue
+            before, after, transforms = plan
+            for source, target in transforms:
+                if not source:
+                    matrix, lengths = _transform(matrix, lengths, source, before, after, target)
+                elif len(hits := np.flatnonzero(_test(matrix, source[0]).any(1))):
+                    matrix, lengths = _update(matrix, lengths, hits, *_transform(matrix[hits], lengths[hits], source, before, after, target))
+        return _unpack(matrix, lengths)
+
+    def _compile(self, change: 'SoundChange'):
+        from .language import Backref
+        if change._transforms is None:
+            change.compile()
+        if any(type(item) is Backref and item < 0 for item in change._before + change._after):
+            return None
+        before, after = (tuple(self._table(item) if type(item) is frozenset else item for item in env) for env in (change._before, change._after))
+        transforms: list[tuple] = []
+        for source, _, target, _ in change._transforms:
+            source = tuple(item if type(item) is int else self._table(item) for item in source)
+            items: list = []
+            for item in target:
+                if type(item) is Backref and item < 0:
+                    items += map(Backref, range(len(source)))
+                elif type(item) is tuple:
+                    pos, mapping = item
+                    lookup = np.full(self._size + 1, -1, dtype=np.int32)
+                    lookup[list(mapping)] = list(mapping.values())
+                    items.append((pos, lookup))
+                else:
+                    items.append(item)
+            transforms.append((source, tuple(items)))
+        return before, after, transforms
+
+    def _table(self, ids):
+        table = np.zeros(self._size + 1, dtype=bool)
+        table[list(ids)] = True
+        return table
+
+def _pack(words: list[PackedWord]):
+    lengths = np.fromiter(map(len, words), dtype=np.int32, count=len(words))
+    matrix = np.full((len(words), max(lengths.max(initial=0), 1)), -1, dtype=np.int32)
+    matrix[np.arange(matrix.shape[1]) < lengths[:, None]] = np.frombuffer(b''.join(words), dtype=np.uint16)
+    return matrix, lengths
+
+def _unpack(matrix: np.ndarray, lengths: np.ndarray):
+    data = matrix[np.arange(matrix.shape[1]) < lengths[:, None]].astype(np.uint16).tobytes()
+    ends = np.cumsum(lengths * 2).tolist()
+    return [PackedWord(data[a:b]) for a, b in zip([0] + ends, ends)]
+
+def _update(matrix: np.ndarray, lengths: np.ndarray, rows: np.ndarray, sub: np.ndarray, sublengths: np.ndarray):
+    if sub.shape[1] > matrix.shape[1]:
+        matrix = np.pad(matrix, ((0, 0), (0, sub.shape[1] - matrix.shape[1])), constant_values=-1)
+    else:
+        matrix[rows] = -1
+    matrix[rows, :sub.shape[1]] = sub
+    lengths = lengths.copy()
+    lengths[rows] = sublengths
+    return matrix, lengths
+
+def _test(view: np.ndarray, item):
+    return view == item if type(item) is int else item[view]
+
+def _transform(matrix: np.ndarray, lengths: np.ndarray, source: tuple, before: tuple, after: tuple, target: tuple):
+    from .language import Backref
+    rows, width = matrix.shape
+    length, left = len(source), len(before)
+    padded = np.full((rows, left + width + length + len(after) + 1), -1, dtype=np.int32)
+    padded[:, left:left + width] = matrix
+    def column(offset: int):
+        return padded[:, left + offset:left + offset + width + 1]
+    at = np.arange(width + 1)
+    n = lengths[:, None]
+    found = at + length <= n
+    for k, item in enumerate(source):
+        found &= _test(column(k), item)
+    for offset, items in ((-1, before), (length, after)):
+        for k, item in enumerate(items):
+            if item is None:
+                found &= at <= k if offset < 0 else at + length + k >= n
+                break
+            view = column(offset - k if offset < 0 else offset + k)
+            found &= view == column(item) if type(item) is Backref else _test(view, item)
+    if not found.any():
+        return matrix, lengths
+    if length > 1:
+        free = np.zeros(rows, dtype=np.int64)
+        for i in np.flatnonzero(found.any(0)).tolist():
+            found[:, i] &= free <= i
+            free = np.where(found[:, i], i + length, free)
+    r, c = np.nonzero(found)
+    values: list[np.ndarray] = []
+    for item in target:
+        if type(item) is int:
+            values.append(np.full(len(r), item, dtype=np.int32))
+        elif type(item) is Backref:
+            values.append(padded[r, left + c + item])
+        else:
+            pos, lookup = item
+            if ((mapped := lookup[padded[r, left + c + pos]]) < 0).any():
+                raise SoundChangeError("sound change: variable in target out of bounds of matching variable in source")
+            values.append(mapped)
+    delta = len(target) - length
+    count = np.cumsum(found, axis=1, dtype=np.int32)
+    lengths = lengths + delta * count[:, -1]
+    result = np.full((rows, max(int(lengths.max()), 1)), -1, dtype=np.int32)
+    keep = at[:width] < n
+    for d in range(min(length, width)):
+        keep[:, d:] &= ~found[:, :width - d]
+    kr, kc = np.nonzero(keep)
+    result[kr, kc + delta * count[kr, kc]] = matrix[kr, kc]
+    start = c + delta * (count[r, c] - 1)
+    for t, v in enumerate(values):
+        result[r, start + t] = v
+    return result, lengths